@@ -1,44 +1,84 @@
 # app.py
 import io
 import re
+import copy
+import hashlib
 import datetime
+from itertools import chain
+from xml.sax.saxutils import escape as xml_escape
 import streamlit as st
 from typing import List, Dict, Iterable
 from docx import Document
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls, nsmap, qn
+from lxml import etree
+
+# A unit code plus, when it is followed by "-" or ":", the rest of the line as its name.
+# The name sits in a lookahead so later codes on the same line are still found.
+_CODE_NAME_RE = re.compile(r"\b([A-Z]{3,}[A-Z0-9]{2,})\b(?:(?=\s*[-:]\s*(.+)))?")
+_PART_HDR_RE = re.compile(r"(qualification|role|activity)\s+details", re.IGNORECASE)
+_PART_HDR_KINDS = ("qualification", "role", "activity")
+_RUN_BREAK_RE = re.compile(r"([\t\r\n])")
+_YEAR_RE = re.compile(r"\d{4}")
+_WORD_RE = re.compile(r"\w+")
+_THIS_YEAR = datetime.date.today().year
+# QA row colour keyed on (has a problem, evidence pending); problems win over pending.
+_QA_COLORS = {(False, False): "lightgreen", (False, True): "khaki", (True, False): "salmon", (True, True): "salmon"}
+
+# Precompiled XPath over the raw body XML; mirrors what python-docx's
+# Paragraph.text / cell.paragraphs would read, without the wrapper objects.
+_BODY_PARAS = etree.XPath("./w:p", namespaces=nsmap)
+_TABLE_CELL_PARAS = etree.XPath("./w:tbl/w:tr/w:tc/w:p", namespaces=nsmap)
+_PARA_TEXT_ITEMS = etree.XPath(
+    "(./w:r | ./w:hyperlink/w:r)/*[self::w:t or self::w:tab or self::w:br or self::w:cr"
+    " or self::w:ptab or self::w:noBreakHyphen]",
+    namespaces=nsmap,
+)
 
 # ---------- helpers ----------
 def normalise_space(s: str) -> str:
-    return re.sub(r"\s+", " ", (s or "")).strip()
+    if not s:
+        return ""
+    # isprintable() is False for every whitespace char except " ", so with no
+    # double spaces only the ends can need fixing.
+    if "  " not in s and s.isprintable():
+        return s.strip()
+    # str.split() splits on the same characters as \s, and drops the ends.
+    return " ".join(s.split())
 
 def all_doc_text_lines(doc: Document) -> Iterable[str]:
-    for p in doc.paragraphs:
-        if p.text:
-            yield p.text
-    for tbl in doc.tables:
-        for row in tbl.rows:
-            for cell in row.cells:
-                for p in cell.paragraphs:
-                    if p.text:
-                        yield p.text
+    body = doc.element.body
+    for p in _BODY_PARAS(body) + _TABLE_CELL_PARAS(body):
+        # oxml run-content elements render their own text equivalent via str()
+        text = "".join(map(str, _PARA_TEXT_ITEMS(p)))
+        if text:
+            yield text
 
 def load_docx(file_bytes: bytes) -> Document:
     return Document(io.BytesIO(file_bytes))
 
-def extract_units_from_doc(doc: Document) -> Dict[str, Dict]:
-    paras = [normalise_space(t) for t in all_doc_text_lines(doc) if normalise_space(t)]
-    full_text = "\n".join(paras)
-    codes = sorted(set(re.findall(r"\b[A-Z]{3,}[A-Z0-9]{2,}\b", full_text)))
+def doc_paragraphs(doc: Document) -> List[str]:
+    return [n for t in all_doc_text_lines(doc) if (n := normalise_space(t))]
+
+def extract_units_from_doc(paras: List[str]) -> Dict[str, Dict]:
+    # One scan over the paragraphs records each code's first mention and inline name.
+    first_seen: Dict[str, tuple] = {}
+    for i, line in enumerate(paras):
+        for m in _CODE_NAME_RE.finditer(line):
+            code = m.group(1)
+            seen = first_seen.get(code)
+            # A later mention on the same first line may still carry the name.
+            if seen is None or (seen[0] == i and not seen[1]):
+                first_seen[code] = (i, m.group(2))
     units: Dict[str, Dict] = {}
-    for code in codes:
-        name = ""
-        for i, line in enumerate(paras):
-            if code in line:
-                m = re.search(rf"{code}\s*[-:]\s*(.+)", line)
-                if m:
-                    name = normalise_space(m.group(1))
-                elif i + 1 < len(paras) and len(paras[i + 1].split()) >= 3:
-                    name = paras[i + 1]
-                break
+    for code in sorted(first_seen):
+        i, name = first_seen[code]
+        if name:
+            name = normalise_space(name)
+        elif i + 1 < len(paras) and paras[i + 1].count(" ") >= 2:  # >= 3 words (paras are normalised)
+            name = paras[i + 1]
+        else:
+            name = ""
         units[code] = {"code": code, "name": name}
     return units
 
@@ -47,64 +87,119 @@ def list_tables_info(doc: Document) -> List[str]:
     for i, t in enumerate(doc.tables):
         header = []
         if len(t.rows) > 0:
-            header = [normalise_space(c.text) for c in t.rows[0].cells]
-        out.append(f"Table {i}: {len(t.rows)} rows x {len(t.columns)} cols | header: {' | '.join(header[:6]) if header else '(none)'}")
+            header = [normalise_space(c.text) for c in t.rows[0].cells[:6]]
+        out.append(f"Table {i}: {len(t.rows)} rows x {len(t.columns)} cols | header: {' | '.join(header) if header else '(none)'}")
     return out
 
 def find_part_tables(doc: Document):
     """Return indexes of Part1, Part2, Part3 tables by unique header text fragments."""
-    p1 = p2 = p3 = -1
+    found = [-1, -1, -1]
     for i, t in enumerate(doc.tables):
         if len(t.columns) < 4:
             continue
-        header = " ".join([normalise_space(c.text) for c in t.rows[0].cells]).lower()
+        header = " ".join(c.text for c in t.rows[0].cells)
+        kinds = {m.group(1).lower() for m in _PART_HDR_RE.finditer(header)}
+        # Same precedence as before: the first still-unassigned part in Part1..3 order wins.
+        for slot, kind in enumerate(_PART_HDR_KINDS):
+            if kind in kinds and found[slot] == -1:
+                found[slot] = i
+                break
+        if -1 not in found:
+            break
 
-        if "qualification details" in header and p1 == -1:
-            p1 = i
-        elif "role details" in header and p2 == -1:
-            p2 = i
-        elif "activity details" in header and p3 == -1:
-            p3 = i
+    return tuple(found)
 
-    return p1, p2, p3
+def iter_blank_rows(table) -> Iterable:
+    """Completely blank rows after the header row 0, in order."""
+    for r in table.rows[1:]:
+        # normalise_space(t) is empty exactly when t.strip() is, without the rebuild.
+        if all(not c.text.strip() for c in r.cells):
+            yield r
 
-def insert_into_table(table, values: List[str]):
+def _run_content_xml(text: str) -> str:
+    # Same mapping as python-docx's run.text setter: \t -> <w:tab/>, \r/\n -> <w:br/>.
+    out = []
+    for piece in _RUN_BREAK_RE.split(text):
+        if piece == "\t":
+            out.append("<w:tab/>")
+        elif piece in ("\r", "\n"):
+            out.append("<w:br/>")
+        elif piece:
+            out.append(f'<w:t xml:space="preserve">{xml_escape(piece)}</w:t>')
+    return "".join(out)
+
+def _new_row_xml(widths: List, values: List[str]):
+    """Build a <w:tr> equivalent to table.add_row() followed by cell.text = value."""
+    cells = []
+    for i, w in enumerate(widths):
+        tc_pr = f'<w:tcPr><w:tcW w:w="{w}" w:type="dxa"/></w:tcPr>' if w is not None else ""
+        para = f"<w:p><w:r>{_run_content_xml(values[i] or '')}</w:r></w:p>" if i < len(values) else "<w:p/>"
+        cells.append(f"<w:tc>{tc_pr}{para}</w:tc>")
+    return parse_xml(f"<w:tr {nsdecls('w')}>{''.join(cells)}</w:tr>")
+
+def insert_rows_into_table(table, rows: List[List[str]]):
     """
-    Insert into the first free (blank) row if available, otherwise add a new row.
-    values: list of strings matching table columns.
+    Fill the first free (blank) rows, then append whatever is left as new rows.
+    rows: one list of strings per row, matching table columns.
     """
-    def row_is_blank(row):
-        return all(not normalise_space(c.text) for c in row.cells)
-
-    # Try to find first completely blank row (skip header row 0)
-    target_row = None
-    for r in table.rows[1:]:
-        if row_is_blank(r):
-            target_row = r
-            break
-
-    if not target_row:
-        target_row = table.add_row()
-
-    for i, v in enumerate(values):
-        if i < len(target_row.cells):
-            target_row.cells[i].text = v or ""
+    # One lazy scan: each fill resumes the search after the row just used.
+    i = 0
+    for values, target_row in zip(rows, iter_blank_rows(table)):
+        for j, v in enumerate(values):
+            if j < len(target_row.cells):
+                target_row.cells[j].text = v or ""
+        i += 1
+
+    # The rest are built as raw <w:tr> XML and spliced in with a single extend().
+    if i < len(rows):
+        tbl = table._tbl
+        widths = [gc.get(qn("w:w")) for gc in tbl.tblGrid.gridCol_lst]
+        tbl.extend(_new_row_xml(widths, values) for values in rows[i:])
 
 def mask_evidence_id(eid: str) -> str:
     eid = (eid or "").strip()
     if not eid or eid.lower() == "pending":
         return "Pending"
-    if len(eid) <= 4:
-        return "*" * (len(eid)-1) + eid[-1] if len(eid) > 1 else eid
-    return "*" * (len(eid)-4) + eid[-4:]
+    # Short IDs keep only their last character, longer ones their last four.
+    keep = 4 if len(eid) > 4 else 1
+    return "*" * (len(eid) - keep) + eid[-keep:]
 
 def validate_year(y: str) -> bool:
-    try:
-        yr = int(y)
-        this_year = datetime.date.today().year
-        return 1000 <= yr <= this_year
-    except:
+    y = (y or "").strip()
+    if not _YEAR_RE.fullmatch(y):
         return False
+    return 1000 <= int(y) <= _THIS_YEAR
+
+def template_digest(file_bytes: bytes) -> str:
+    return hashlib.blake2b(file_bytes, digest_size=16).hexdigest()
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _pristine_template_doc(file_hash: str, _file_bytes: bytes) -> Document:
+    # Keyed on the digest only (Streamlit skips underscore args when hashing).
+    # Only ever deep-copied. Touching wrappers like .tables on it would cache a
+    # Body that a later deepcopy detaches from the copied tree.
+    return load_docx(_file_bytes)
+
+def fresh_template_doc(file_hash: str, file_bytes: bytes) -> Document:
+    """Writable copy of the template; deepcopy is cheaper than re-reading the zip + XML."""
+    return copy.deepcopy(_pristine_template_doc(file_hash, file_bytes))
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def parse_template(file_hash: str, _file_bytes: bytes) -> Dict:
+    """
+    Derive the template data once per upload and keep only picklable results
+    (Document objects don't pickle; export takes its own fresh copy).
+    Keyed on the digest so reruns don't rehash the upload.
+    """
+    doc = fresh_template_doc(file_hash, _file_bytes)
+    paras = doc_paragraphs(doc)
+    return {
+        "units": extract_units_from_doc(paras),
+        "tables_info": list_tables_info(doc),
+        "part_indices": find_part_tables(doc),
+        # Upper-cased words of the document, for whole-word checks of manually entered codes.
+        "words_up": frozenset(chain.from_iterable(_WORD_RE.findall(p.upper()) for p in paras)),
+    }
 
 # ---------- Streamlit UI ----------
 st.set_page_config(page_title="VCMT Unit Code Filler", page_icon="🗂", layout="wide")
@@ -117,38 +212,43 @@ if not uploaded:
     st.info("Upload the VCMT .docx template to begin.")
     st.stop()
 
-if "uploaded_bytes" not in st.session_state:
-    st.session_state.uploaded_bytes = uploaded.read()
+# Copy the upload out only when a different file arrives, not on every rerun.
+if st.session_state.get("uploaded_file_id") != uploaded.file_id:
+    st.session_state.uploaded_bytes = uploaded.getvalue()
+    st.session_state.uploaded_hash = template_digest(st.session_state.uploaded_bytes)
+    st.session_state.uploaded_file_id = uploaded.file_id
 
 try:
-    doc = load_docx(st.session_state.uploaded_bytes)
+    template = parse_template(st.session_state.uploaded_hash, st.session_state.uploaded_bytes)
     st.success("Template loaded.")
 except Exception as e:
     st.error(f"Could not load .docx: {e}")
     st.stop()
 
 with st.expander("Template tables found", expanded=False):
-    for line in list_tables_info(doc):
+    for line in template["tables_info"]:
         st.write(line)
 
 # --- Step 2 ---
 st.header("Step 2 — Detect & select unit(s)")
-extracted_units = extract_units_from_doc(doc)
-discovered_codes = sorted(extracted_units.keys())
+extracted_units = template["units"]
+discovered_codes = list(extracted_units)  # already in sorted order
 user_unit_codes = st.multiselect("Choose unit code(s)", options=discovered_codes, default=[])
 
 manual_units_input = st.text_input("Optional: add unit code(s) comma-separated")
 if manual_units_input.strip():
-    added = [normalise_space(x).upper() for x in manual_units_input.split(",") if normalise_space(x)]
-    user_unit_codes = list(dict.fromkeys([u.upper() for u in user_unit_codes] + added))
+    added = (c for x in manual_units_input.split(",") if (c := normalise_space(x).upper()))
+    user_unit_codes = list(dict.fromkeys(chain((u.upper() for u in user_unit_codes), added)))
 
-full_text_up = "\n".join(all_doc_text_lines(doc)).upper()
-validated_codes = [c for c in user_unit_codes if c.strip().upper() in full_text_up]
+validated_codes = []
+for c in user_unit_codes:
+    c = c.strip().upper()
+    if c in extracted_units or c in template["words_up"]:
+        validated_codes.append(c)
 
 if not validated_codes:
     st.info("Please select at least one valid unit code.")
     st.stop()
-validated_codes = [c.strip().upper() for c in validated_codes]
 st.success("Validated unit codes: " + ", ".join(validated_codes))
 
 if "units_data" not in st.session_state:
@@ -159,7 +259,9 @@ if "edit_unit" not in st.session_state:
 # --- Step 3 ---
 st.header("Step 3 — Enter details for each unit")
 for unit_code in validated_codes:
-    unit_name = extracted_units.get(unit_code, {}).get("name", "")
+    # Manually entered codes may only appear in free text, with no extracted entry.
+    unit = extracted_units.get(unit_code)
+    unit_name = unit["name"] if unit else ""
     key = f"unit__{unit_code}"
     if key not in st.session_state.units_data:
         st.session_state.units_data[key] = {
@@ -172,100 +274,105 @@ for unit_code in validated_codes:
 
     expanded_flag = (st.session_state.edit_unit == unit_code)
     with st.expander(f"{unit_code} — {unit_name}", expanded=expanded_flag or True):
-        # --- Part 1 ---
-        st.subheader("Part 1 — Qualifications / Units of Competency")
-        if st.button(f"Add Qualification for {unit_code}", key=f"add_p1_{unit_code}"):
-            st.session_state.units_data[key]["part1"].append({"qual_name":"", "year":"", "evidence_id":"", "generated_statement":""})
-        for idx, entry in enumerate(st.session_state.units_data[key]["part1"]):
-            entry["qual_name"] = st.text_input("Qualification name", key=f"{unit_code}_p1_name_{idx}", value=entry["qual_name"])
-            entry["year"] = st.text_input("Year completed (YYYY)", key=f"{unit_code}_p1_year_{idx}", value=entry["year"])
-            entry["evidence_id"] = st.text_input("Evidence ID", key=f"{unit_code}_p1_eid_{idx}", value=entry["evidence_id"])
-            entry["generated_statement"] = f"Within this qualification, I was required to demonstrate competency in {unit_name}."
-
-        # --- Part 2 ---
-        st.subheader("Part 2 — Industry / Community Experience")
-        if st.button(f"Add Experience for {unit_code}", key=f"add_p2_{unit_code}"):
-            st.session_state.units_data[key]["part2"].append({"role_title":"", "employer":"", "years_worked":"", "evidence_id":"", "generated_statement":""})
-        for idx, entry in enumerate(st.session_state.units_data[key]["part2"]):
-            entry["role_title"] = st.text_input("Role title", key=f"{unit_code}_p2_role_{idx}", value=entry["role_title"])
-            entry["employer"] = st.text_input("Employer", key=f"{unit_code}_p2_emp_{idx}", value=entry["employer"])
-            entry["years_worked"] = st.text_input("Years worked (e.g., 2013–2015)", key=f"{unit_code}_p2_years_{idx}", value=entry["years_worked"])
-            entry["evidence_id"] = st.text_input("Evidence ID", key=f"{unit_code}_p2_eid_{idx}", value=entry["evidence_id"])
-            entry["generated_statement"] = f"Key responsibilities relevant to {unit_code} {unit_name}."
-
-        # --- Part 3 ---
-        st.subheader("Part 3 — Professional Development")
-        if st.button(f"Add PD for {unit_code}", key=f"add_p3_{unit_code}"):
-            st.session_state.units_data[key]["part3"].append({"pd_title":"", "year":"", "evidence_id":"", "generated_statement":""})
-        for idx, entry in enumerate(st.session_state.units_data[key]["part3"]):
-            entry["pd_title"] = st.text_input("PD title", key=f"{unit_code}_p3_title_{idx}", value=entry["pd_title"])
-            entry["year"] = st.text_input("Year (YYYY)", key=f"{unit_code}_p3_year_{idx}", value=entry["year"])
-            entry["evidence_id"] = st.text_input("Evidence ID", key=f"{unit_code}_p3_eid_{idx}", value=entry["evidence_id"])
-            entry["generated_statement"] = f"This professional development enhanced my ability to meet criteria for {unit_code} {unit_name}."
+        # Buttons can't live inside a form, so row creation sits above it.
+        # Statements depend only on the unit, so they are stamped onto a row once, when it is added.
+        add_p1, add_p2, add_p3 = st.columns(3)
+        if add_p1.button(f"Add Qualification for {unit_code}", key=f"add_p1_{unit_code}"):
+            st.session_state.units_data[key]["part1"].append({"qual_name":"", "year":"", "evidence_id":"", "generated_statement":f"Within this qualification, I was required to demonstrate competency in {unit_name}."})
+        if add_p2.button(f"Add Experience for {unit_code}", key=f"add_p2_{unit_code}"):
+            st.session_state.units_data[key]["part2"].append({"role_title":"", "employer":"", "years_worked":"", "evidence_id":"", "generated_statement":f"Key responsibilities relevant to {unit_code} {unit_name}."})
+        if add_p3.button(f"Add PD for {unit_code}", key=f"add_p3_{unit_code}"):
+            st.session_state.units_data[key]["part3"].append({"pd_title":"", "year":"", "evidence_id":"", "generated_statement":f"This professional development enhanced my ability to meet criteria for {unit_code} {unit_name}."})
+
+        # Edits are only sent (and the script rerun) when the unit's form is saved.
+        with st.form(f"form_{unit_code}"):
+            # --- Part 1 ---
+            st.subheader("Part 1 — Qualifications / Units of Competency")
+            for idx, entry in enumerate(st.session_state.units_data[key]["part1"]):
+                entry["qual_name"] = st.text_input("Qualification name", key=f"{unit_code}_p1_name_{idx}", value=entry["qual_name"])
+                entry["year"] = st.text_input("Year completed (YYYY)", key=f"{unit_code}_p1_year_{idx}", value=entry["year"])
+                entry["evidence_id"] = st.text_input("Evidence ID", key=f"{unit_code}_p1_eid_{idx}", value=entry["evidence_id"])
+
+            # --- Part 2 ---
+            st.subheader("Part 2 — Industry / Community Experience")
+            for idx, entry in enumerate(st.session_state.units_data[key]["part2"]):
+                entry["role_title"] = st.text_input("Role title", key=f"{unit_code}_p2_role_{idx}", value=entry["role_title"])
+                entry["employer"] = st.text_input("Employer", key=f"{unit_code}_p2_emp_{idx}", value=entry["employer"])
+                entry["years_worked"] = st.text_input("Years worked (e.g., 2013–2015)", key=f"{unit_code}_p2_years_{idx}", value=entry["years_worked"])
+                entry["evidence_id"] = st.text_input("Evidence ID", key=f"{unit_code}_p2_eid_{idx}", value=entry["evidence_id"])
+
+            # --- Part 3 ---
+            st.subheader("Part 3 — Professional Development")
+            for idx, entry in enumerate(st.session_state.units_data[key]["part3"]):
+                entry["pd_title"] = st.text_input("PD title", key=f"{unit_code}_p3_title_{idx}", value=entry["pd_title"])
+                entry["year"] = st.text_input("Year (YYYY)", key=f"{unit_code}_p3_year_{idx}", value=entry["year"])
+                entry["evidence_id"] = st.text_input("Evidence ID", key=f"{unit_code}_p3_eid_{idx}", value=entry["evidence_id"])
+
+            st.form_submit_button("Save")
 
 # --- Step 4 ---
 st.header("Step 4 — QA and Export")
-rows_p1, rows_p2, rows_p3, row_to_unit = [], [], [], []
+# (unit_code, entry) pairs per part, so every QA row knows which unit it belongs to.
+rows_by_part = {"part1": [], "part2": [], "part3": []}
 for data in st.session_state.units_data.values():
-    ucode = data["unit_code"]
-    for p in data["part1"]:
-        rows_p1.append(p); row_to_unit.append(ucode)
-    for r in data["part2"]:
-        rows_p2.append(r); row_to_unit.append(ucode)
-    for r in data["part3"]:
-        rows_p3.append(r); row_to_unit.append(ucode)
+    for part, rows in rows_by_part.items():
+        rows.extend((data["unit_code"], e) for e in data[part])
+rows_p1, rows_p2, rows_p3 = rows_by_part["part1"], rows_by_part["part2"], rows_by_part["part3"]
 
 st.subheader("QA Preview")
+edit_targets: Dict[str, str] = {}
 def qa_block(rows, partname):
-    for i, r in enumerate(rows, 1):
+    # One markdown element per part instead of one per row.
+    html_rows = []
+    for i, (ucode, r) in enumerate(rows, 1):
         label = r.get("qual_name") or r.get("role_title") or r.get("pd_title")
         year_val = r.get("year", r.get("years_worked", ""))
         eid = r.get("evidence_id","")
         pending = (not eid) or eid.lower()=="pending"
         invalid_year = "year" in r and r["year"] and not validate_year(r["year"])
-        missing = not label
-        color = "lightgreen"
-        if missing or invalid_year: color="salmon"
-        elif pending: color="khaki"
-        st.markdown(
-            f"<div style='background-color:{color}; padding:6px; border-radius:5px;'>{partname}: {label} | {year_val} | Evidence: {mask_evidence_id(eid)}</div>",
-            unsafe_allow_html=True
+        color = _QA_COLORS[(not label or bool(invalid_year), pending)]
+        html_rows.append(
+            f"<div style='background-color:{color}; padding:6px; border-radius:5px; margin-bottom:4px;'>{partname}: {label} | {year_val} | Evidence: {mask_evidence_id(eid)}</div>"
         )
-        if st.button(f"Edit {partname} Row {i}", key=f"edit_{partname}_{i}"):
-            st.session_state.edit_unit = row_to_unit[i-1]
-            st.experimental_rerun()
+        edit_targets[f"{partname} Row {i} ({ucode})"] = ucode
+    st.markdown("".join(html_rows), unsafe_allow_html=True)
 
 if rows_p1: qa_block(rows_p1, "Part1")
 if rows_p2: qa_block(rows_p2, "Part2")
 if rows_p3: qa_block(rows_p3, "Part3")
 
+if edit_targets:
+    pick_col, edit_col = st.columns([4, 1])
+    edit_choice = pick_col.selectbox("Row to edit", options=list(edit_targets))
+    if edit_col.button("Edit row"):
+        st.session_state.edit_unit = edit_targets[edit_choice]
+
 if st.button("Generate and Download VCMT (.docx)"):
-    out_doc = load_docx(st.session_state.uploaded_bytes)
-    p1_idx, p2_idx, p3_idx = find_part_tables(out_doc)
+    out_doc = fresh_template_doc(st.session_state.uploaded_hash, st.session_state.uploaded_bytes)
+    p1_idx, p2_idx, p3_idx = template["part_indices"]
 
     if p1_idx != -1:
-        for r in rows_p1:
-            insert_into_table(out_doc.tables[p1_idx], [
-                r["qual_name"], r["year"], r["generated_statement"], r["evidence_id"]
-            ])
+        insert_rows_into_table(out_doc.tables[p1_idx], [
+            [r["qual_name"], r["year"], r["generated_statement"], r["evidence_id"]]
+            for _, r in rows_p1
+        ])
 
     if p2_idx != -1:
-        for r in rows_p2:
-            insert_into_table(out_doc.tables[p2_idx], [
-                r["role_title"] + (f' ({r["employer"]})' if r["employer"] else ""),
-                r["years_worked"], r["generated_statement"], r["evidence_id"]
-            ])
+        insert_rows_into_table(out_doc.tables[p2_idx], [
+            [r["role_title"] + (f' ({r["employer"]})' if r["employer"] else ""),
+             r["years_worked"], r["generated_statement"], r["evidence_id"]]
+            for _, r in rows_p2
+        ])
 
     if p3_idx != -1:
-        for r in rows_p3:
-            insert_into_table(out_doc.tables[p3_idx], [
-                r["pd_title"], r["year"], r["generated_statement"], r["evidence_id"]
-            ])
+        insert_rows_into_table(out_doc.tables[p3_idx], [
+            [r["pd_title"], r["year"], r["generated_statement"], r["evidence_id"]]
+            for _, r in rows_p3
+        ])
 
     today = datetime.date.today().isoformat().replace("-", "")
     filename = f"VCMT_{'_'.join(validated_codes)}_{today}.docx"
     bio = io.BytesIO()
     out_doc.save(bio)
-    bio.seek(0)
-    st.download_button("Download filled VCMT (.docx)", data=bio.read(), file_name=filename,
+    st.download_button("Download filled VCMT (.docx)", data=bio.getvalue(), file_name=filename,
                        mime="application/vnd.openxmlformats-officedocument.wordprocessingml.document")